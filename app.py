@@ -1,21 +1,31 @@
 import os
-import json
+import codecs
+import functools
+import hashlib
+import importlib.util
 import logging
+import queue
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Optional
-import PyPDF2
-import docx
-from flask import Flask, request, jsonify, send_from_directory
+from typing import BinaryIO, Dict, Any, Iterator, List, Optional, Tuple
+import ijson
+import orjson
+from flask import Flask, Request, Response, request, send_from_directory, stream_with_context
+from flask_compress import Compress
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 from dotenv import load_dotenv
 
-# Google Cloud AI imports
+# Google Cloud AI is imported on first use (it pulls in grpc and protobuf); only check it is installed
 try:
-    import google.generativeai as genai
-    from google.oauth2 import service_account
-    GOOGLE_AI_AVAILABLE = True
-except ImportError:
+    GOOGLE_AI_AVAILABLE = importlib.util.find_spec("google.generativeai") is not None
+except ModuleNotFoundError:
     GOOGLE_AI_AVAILABLE = False
+if not GOOGLE_AI_AVAILABLE:
     print("Warning: Google AI libraries not installed. Install with: pip install google-generativeai")
 
 # Load environment variables
@@ -30,6 +40,412 @@ else:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Analysis templates per document type - matching DOCUMENT_TYPES.md exactly
+_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    "contract": {
+        "fields": ["documentType", "summary", "parties", "keyTerms", "obligations", "deliverables", "timeline", "paymentTerms", "terminationClauses", "penalties", "disputeResolution", "risks", "recommendations"],
+        "focus": "contractual obligations, performance requirements, and legal commitments"
+    },
+    "nda": {
+        "fields": ["documentType", "summary", "parties", "confidentialInfo", "restrictions", "duration", "exceptions", "returnRequirements", "penalties", "risks", "recommendations"],
+        "focus": "confidentiality obligations, information protection, and disclosure restrictions"
+    },
+    "will": {
+        "fields": ["documentType", "summary", "testator", "executor", "beneficiaries", "assets", "bequests", "guardianship", "conditions", "witnesses", "risks", "recommendations"],
+        "focus": "asset distribution, beneficiary rights, and estate planning"
+    },
+    "lease": {
+        "fields": ["documentType", "summary", "parties", "property", "rentAmount", "leaseTerm", "responsibilities", "restrictions", "renewalOptions", "terminationConditions", "securityDeposit", "risks", "recommendations"],
+        "focus": "rental obligations, property usage rights, and tenancy terms"
+    },
+    "employment": {
+        "fields": ["documentType", "summary", "parties", "position", "salary", "benefits", "duties", "workingConditions", "terminationConditions", "confidentiality", "nonCompete", "risks", "recommendations"],
+        "focus": "employment terms, job responsibilities, and worker rights"
+    },
+    "partnership": {
+        "fields": ["documentType", "summary", "partners", "businessPurpose", "capitalContributions", "profitSharing", "managementStructure", "decisionMaking", "dissolution", "liabilities", "risks", "recommendations"],
+        "focus": "business partnership terms, profit sharing, and management responsibilities"
+    },
+    "power_of_attorney": {
+        "fields": ["documentType", "summary", "principal", "agent", "powers", "limitations", "duration", "conditions", "revocation", "witnessRequirements", "risks", "recommendations"],
+        "focus": "delegated authority, agent powers, and principal protection"
+    },
+    "license": {
+        "fields": ["documentType", "summary", "parties", "licensedProperty", "scope", "restrictions", "royalties", "term", "terminationRights", "intellectualProperty", "risks", "recommendations"],
+        "focus": "usage rights, licensing terms, and intellectual property protection"
+    },
+    "settlement": {
+        "fields": ["documentType", "summary", "parties", "dispute", "settlementAmount", "paymentTerms", "releases", "conditions", "confidentiality", "enforcement", "risks", "recommendations"],
+        "focus": "dispute resolution, settlement terms, and legal releases"
+    },
+    "corporate": {
+        "fields": ["documentType", "summary", "entity", "directors", "shareholders", "governance", "voting", "meetings", "fiduciary", "compliance", "risks", "recommendations"],
+        "focus": "corporate governance, shareholder rights, and regulatory compliance"
+    },
+    "real_estate": {
+        "fields": ["documentType", "summary", "parties", "property", "purchasePrice", "financing", "contingencies", "inspections", "closing", "warranties", "risks", "recommendations"],
+        "focus": "property transfer, purchase terms, and real estate obligations"
+    },
+    "court_order": {
+        "fields": ["documentType", "summary", "court", "parties", "ruling", "requirements", "deadlines", "penalties", "compliance", "appealRights", "risks", "recommendations"],
+        "focus": "court mandates, compliance requirements, and legal obligations"
+    },
+    "judgment": {
+        "fields": ["documentType", "summary", "court", "parties", "caseNumber", "legalIssues", "facts", "legalPrinciples", "ratio", "ruling", "precedents", "implications", "recommendations"],
+        "focus": "judicial reasoning, legal precedents, and case implications"
+    },
+    "affidavit": {
+        "fields": ["documentType", "summary", "deponent", "purpose", "facts", "statements", "verification", "notarization", "jurisdiction", "consequences", "risks", "recommendations"],
+        "focus": "sworn statements, factual declarations, and legal attestations"
+    },
+    "legal_notice": {
+        "fields": ["documentType", "summary", "sender", "recipient", "issue", "demands", "deadlines", "consequences", "legalBasis", "nextSteps", "risks", "recommendations"],
+        "focus": "legal demands, compliance requirements, and potential consequences"
+    },
+    "insurance": {
+        "fields": ["documentType", "summary", "parties", "coverage", "premiums", "deductibles", "exclusions", "claims", "beneficiaries", "renewal", "risks", "recommendations"],
+        "focus": "insurance coverage, policy terms, and claim procedures"
+    },
+    "loan": {
+        "fields": ["documentType", "summary", "parties", "loanAmount", "interestRate", "repaymentTerms", "collateral", "defaults", "acceleration", "guarantees", "risks", "recommendations"],
+        "focus": "lending terms, repayment obligations, and default consequences"
+    },
+    "general": {
+        "fields": ["documentType", "summary", "keyPoints", "parties", "importantDates", "financialTerms", "obligations", "risks", "recommendations"],
+        "focus": "general legal provisions and key obligations"
+    }
+}
+
+# Document-specific field descriptions (matching DOCUMENT_TYPES.md exactly)
+_ENHANCED_DESCRIPTIONS: Dict[str, Dict[str, str]] = {
+    "contract": {
+        "keyTerms": "Most important contractual provisions",
+        "obligations": "What each party must do ",
+        "deliverables": "Specific items/services to be provided",
+        "timeline": "Important deadlines and milestones",
+        "paymentTerms": "Financial obligations and schedules",
+        "terminationClauses": "How the contract can end",
+        "penalties": "Consequences for breach",
+        "disputeResolution": "How conflicts are resolved"
+    },
+    "nda": {
+        "confidentialInfo": "What information is protected",
+        "restrictions": "Limitations on use and disclosure",
+        "duration": "How long confidentiality lasts",
+        "exceptions": "What information is not protected",
+        "returnRequirements": "What must be returned/destroyed",
+        "penalties": "Consequences for breach"
+    },
+    "will": {
+        "testator": "Person making the will ",
+        "executor": "Person managing the estate ",
+        "beneficiaries": "Who receives assets ",
+        "assets": "Property and belongings being distributed ",
+        "bequests": "Specific gifts and distributions ",
+        "guardianship": "Care arrangements for minors "
+    },
+    "lease": {
+        "property": "Description of leased premises",
+        "rentAmount": "Monthly/periodic payment",
+        "leaseTerm": "Duration of the lease",
+        "responsibilities": "Maintenance and care duties",
+        "securityDeposit": "Upfront payment requirements",
+        "renewalOptions": "Extension possibilities"
+    },
+    "employment": {
+        "position": "Job title and role",
+        "salary": "Compensation details",
+        "benefits": "Healthcare, vacation, etc.",
+        "duties": "Job responsibilities",
+        "workingConditions": "Hours, location, etc.",
+        "nonCompete": "Post-employment restrictions"
+    },
+    "partnership": {
+        "partners": "Business partners involved",
+        "businessPurpose": "What the partnership does",
+        "capitalContributions": "Money/assets each partner provides",
+        "profitSharing": "How profits are divided",
+        "managementStructure": "Who makes decisions",
+        "dissolution": "How partnership ends"
+    },
+    "power_of_attorney": {
+        "principal": "Person granting power",
+        "agent": "Person receiving power",
+        "powers": "What the agent can do",
+        "limitations": "Restrictions on authority",
+        "duration": "How long powers last",
+        "revocation": "How to cancel"
+    },
+    "license": {
+        "licensedProperty": "What's being licensed",
+        "scope": "Permitted uses",
+        "restrictions": "What's not allowed",
+        "royalties": "Payment terms",
+        "term": "License duration",
+        "intellectualProperty": "IP rights and protections"
+    },
+    "settlement": {
+        "dispute": "What conflict is being resolved",
+        "settlementAmount": "Payment details",
+        "paymentTerms": "When and how payment is made",
+        "releases": "What claims are being dropped",
+        "conditions": "Requirements for settlement",
+        "confidentiality": "Non-disclosure requirements"
+    },
+    "corporate": {
+        "entity": "Corporation details",
+        "directors": "Board members and roles",
+        "shareholders": "Ownership structure",
+        "governance": "How decisions are made",
+        "voting": "Shareholder voting rights",
+        "compliance": "Regulatory requirements"
+    },
+    "real_estate": {
+        "property": "Real estate being transferred",
+        "purchasePrice": "Sale amount",
+        "financing": "Loan and mortgage terms",
+        "contingencies": "Conditions for sale",
+        "inspections": "Property examination requirements",
+        "closing": "Transaction completion details"
+    },
+    "court_order": {
+        "court": "Issuing court information",
+        "ruling": "Court's decision",
+        "requirements": "What must be done",
+        "deadlines": "Time limits for compliance",
+        "penalties": "Consequences for non-compliance",
+        "appealRights": "Options for challenging"
+    },
+    "judgment": {
+        "court": "Court that delivered the judgment",
+        "caseNumber": "Official case reference",
+        "legalIssues": "Questions of law addressed",
+        "facts": "Key factual findings",
+        "legalPrinciples": "Legal doctrines applied",
+        "ratio": "The legal reasoning behind the decision (ratio decidendi)",
+        "ruling": "The final decision",
+        "precedents": "Previous cases cited",
+        "implications": "Impact on future cases"
+    },
+    "affidavit": {
+        "deponent": "Person making the sworn statement",
+        "purpose": "Reason for the affidavit",
+        "facts": "Factual statements being attested",
+        "statements": "Important declarations made",
+        "verification": "How the statement is verified",
+        "notarization": "Notary and witnessing details",
+        "jurisdiction": "Legal jurisdiction for the affidavit",
+        "consequences": "Implications of false statements"
+    },
+    "legal_notice": {
+        "sender": "Who is sending the notice",
+        "recipient": "Who must respond",
+        "issue": "Problem being addressed",
+        "demands": "What is required",
+        "deadlines": "Time limits for response",
+        "consequences": "What happens if ignored"
+    },
+    "insurance": {
+        "coverage": "What is protected",
+        "premiums": "Payment amounts",
+        "deductibles": "Out-of-pocket costs",
+        "exclusions": "What's not covered",
+        "claims": "How to file claims",
+        "beneficiaries": "Who receives payouts"
+    },
+    "loan": {
+        "loanAmount": "How much is borrowed",
+        "interestRate": "Cost of borrowing",
+        "repaymentTerms": "Payment schedule",
+        "collateral": "Security for the loan",
+        "defaults": "What happens if payments stop",
+        "guarantees": "Additional security"
+    }
+}
+
+# Document types the classifier may return
+_VALID_DOC_TYPES = frozenset({
+    "contract", "nda", "will", "lease", "employment", "partnership",
+    "power_of_attorney", "license", "settlement", "corporate",
+    "real_estate", "court_order", "judgment", "affidavit", "legal_notice",
+    "insurance", "loan", "general"
+})
+
+# Fields rendered as arrays of strings in the analysis JSON structure
+_ACTIONABLE_LIST_FIELDS = frozenset({"risks", "recommendations"})
+_LIST_FIELDS = frozenset({"obligations", "keyTerms", "statements", "facts", "precedents", "legalPrinciples"})
+
+# Analysis generation: bounded output, low temperature for consistent results, and strict JSON
+# output so responses normally parse without markdown fence stripping (each document type
+# adds a response schema for its fields)
+_ANALYSIS_GENERATION_CONFIG = {
+    "max_output_tokens": int(os.getenv('GEMINI_MAX_OUTPUT_TOKENS', '8192')),
+    "temperature": 0.2,
+    "response_mime_type": "application/json",
+}
+
+# The classifier answers with a single category name
+_DETECTION_GENERATION_CONFIG = {
+    "max_output_tokens": 20,
+    "temperature": 0.0,
+}
+
+# How long an analysis waits for a free Gemini slot before the request is rejected,
+# and the Retry-After sent with that rejection
+_GEMINI_SLOT_WAIT_SECONDS = 2
+_GEMINI_BUSY_RETRY_AFTER_SECONDS = 5
+
+# Maximum number of documents accepted by a single batch analysis request
+_BATCH_MAX_DOCUMENTS = 10
+
+# Result of a shared analysis whose leading request went away before it finished
+_FLIGHT_ABANDONED = object()
+
+# Number of leading characters used to classify a document
+_DETECTION_MAX_CHARS = 4000
+
+# Conservative limit on document characters sent to Gemini for analysis (token limits)
+_MAX_ANALYSIS_CHARS = 30000
+
+# A response wrapped in a markdown code block: the body between the opening fence line
+# (```json or ```) and the closing fence. Anything after the closing fence (trailing prose)
+# is ignored, and the closing fence may be missing if the output was cut off.
+_FENCE_RE = re.compile(r'\A```[^\n]*\n(.*?)(?:\n[ \t]*```.*)?\Z', re.S)
+
+# Returned (as a shallow copy) when the AI response is not valid JSON; the nested
+# recommendations are shared between failures and never modified
+_PARSE_FAILURE_RESULT: Dict[str, Any] = {
+    "documentType": "Document Analysis",
+    "summary": "The document was analyzed but the response could not be parsed into structured format. The AI may have provided analysis in an unexpected format.",
+    "error": "JSON parsing failed",
+    "errorDetails": None,
+    "rawResponse": None,
+    "recommendations": [{
+        "item": "Manual review recommended",
+        "severity": "HIGH",
+        "explanation": "The automated analysis encountered formatting issues. Please review the raw response above.",
+        "action": "Contact support or retry the analysis"
+    }]
+}
+
+# Characters of an unparseable AI response included in the fallback result
+_RAW_RESPONSE_PREVIEW_CHARS = 800
+
+@functools.cache
+def _get_genai():
+    """Import google.generativeai once, on first use"""
+    import google.generativeai as genai
+    return genai
+
+def _response_schema(fields: List[str]) -> Dict[str, Any]:
+    """Gemini response schema for a document type: every field of its template, typed as in the prompt"""
+    string_list = {"type": "array", "items": {"type": "string"}}
+    return {
+        "type": "object",
+        "properties": {
+            field: string_list if field in _ACTIONABLE_LIST_FIELDS or field in _LIST_FIELDS else {"type": "string"}
+            for field in fields
+        },
+        "required": list(fields),
+    }
+
+def _render_field(field: str, description: Any) -> str:
+    """Render one field of the JSON structure shown in the analysis prompt"""
+    # Use simple string format for all fields to ensure proper parsing
+    if field in _ACTIONABLE_LIST_FIELDS:
+        return f'\n    "{field}": [\n        "First {field[:-1]} item with clear explanation",\n        "Second {field[:-1]} item with actionable details",\n        "Additional {field[:-1]} items as needed"\n    ]'
+    if field in _LIST_FIELDS:
+        return f'\n    "{field}": [\n        "First {field[:-1]} item with clear explanation",\n        "Second {field[:-1]} item with practical details",\n        "Additional {field[:-1]} items as needed"\n    ]'
+    return f'\n    "{field}": "Provide detailed information about {description}"'
+
+def _stream_digest(stream: BinaryIO) -> str:
+    """SHA-256 of a binary stream's contents; the stream is rewound afterwards"""
+    stream.seek(0)
+    # file_digest reads into a reusable buffer and hashes in C with OpenSSL (SHA-NI where available)
+    digest = hashlib.file_digest(stream, 'sha256')
+    stream.seek(0)
+    return digest.hexdigest()
+
+def _file_cache_key(digest: str, file_name: str) -> str:
+    """Cache key for an uploaded file: content digest plus extension, since the extension picks the extractor"""
+    return f"{digest}{Path(file_name).suffix.lower()}"
+
+class _StreamingFieldParser:
+    """Incrementally parses a streamed JSON object, returning top-level fields as they complete"""
+    
+    def __init__(self):
+        self._fields = ijson.sendable_list()
+        self._parser = ijson.kvitems_coro(self._fields, '', use_float=True)
+        self._leading_text = ""
+        self._started = False
+        self._failed = False
+    
+    def feed(self, text: str) -> List[Tuple[str, Any]]:
+        """Feed the next chunk of response text; returns the (field, value) pairs it completed"""
+        if self._failed:
+            return []
+        
+        if not self._started:
+            # Hold back the start of the response until any markdown code fence can be skipped
+            self._leading_text += text
+            text = self._leading_text.lstrip()
+            if not text:
+                return []
+            if text.startswith('`'):
+                if '\n' not in text:
+                    return []
+                text = text.split('\n', 1)[1]
+            self._started = True
+        
+        try:
+            self._parser.send(text.encode('utf-8'))
+        except ijson.JSONError:
+            # Malformed or trailing output (e.g. a closing fence); the final parse still handles it
+            self._failed = True
+        
+        fields = list(self._fields)
+        del self._fields[:]
+        return fields
+    
+    def finish(self) -> bool:
+        """Signal the end of the response; returns True if it was a single, complete JSON document"""
+        if self._failed or not self._started:
+            return False
+        try:
+            self._parser.close()
+        except ijson.JSONError:
+            return False
+        return True
+
+class _LRUCache:
+    """Thread-safe in-memory least-recently-used cache"""
+    
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Any:
+        """Return the cached value for key, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key: str, value: Any):
+        """Store a value, evicting the least recently used entry when full"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+class AnalyzerBusyError(Exception):
+    """Raised when an analysis cannot get a Gemini slot because too many are in progress"""
+
 class GoogleCloudLegalAnalyzer:
     """Legal Document Analysis using Google Cloud Generative AI (Gemini)"""
     
@@ -37,11 +453,44 @@ class GoogleCloudLegalAnalyzer:
         """Initialize the analyzer with Google Cloud AI configuration"""
         self.model_name = "gemini-1.5-flash"  # You can also use "gemini-1.5-pro" for more complex analysis
         
+        # Smaller model used when the main model times out
+        self.fallback_model_name = os.getenv('GEMINI_FALLBACK_MODEL', 'gemini-1.5-flash-8b')
+        self.request_timeout = float(os.getenv('GEMINI_TIMEOUT_SECONDS', '60'))
+        # A streamed call's deadline covers the whole generation, up to max_output_tokens of output
+        self.stream_timeout = float(os.getenv('GEMINI_STREAM_TIMEOUT_SECONDS', '180'))
+        
+        # LRU cache of completed analyses keyed by SHA-256 of the uploaded file and of the document text
+        self._analysis_cache = _LRUCache(int(os.getenv('ANALYSIS_CACHE_SIZE', '128')))
+        
+        # LRU cache of extracted document text keyed by SHA-256 of the uploaded file
+        self._text_cache = _LRUCache(int(os.getenv('TEXT_CACHE_SIZE', '64')))
+        
+        # Analyses currently running, by file cache key, so identical concurrent uploads wait on one
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        
+        # Analysis generation configs per document type, constraining output to that type's fields
+        self._generation_configs: Dict[str, Dict[str, Any]] = {
+            document_type: {**_ANALYSIS_GENERATION_CONFIG, "response_schema": _response_schema(template["fields"])}
+            for document_type, template in _TEMPLATES.items()
+        }
+        
+        # Static analysis prompt prefixes per document type, built once
+        self._prompt_prefixes: Dict[str, str] = {
+            document_type: self._build_prompt_prefix(document_type) for document_type in _TEMPLATES
+        }
+        
+        # Caps analyses streaming from Gemini at once (per worker process), sized to the API quota
+        self._gemini_concurrency = int(os.getenv('GEMINI_CONCURRENCY', '5'))
+        self._gemini_slots = threading.BoundedSemaphore(self._gemini_concurrency)
+        # One thread per slot reads each Gemini stream to the end, independently of the client
+        self._gemini_executor = ThreadPoolExecutor(max_workers=self._gemini_concurrency, thread_name_prefix="gemini")
+        
         # Initialize Google AI
         self._setup_google_ai()
         
         logger.info("Google Cloud Legal Document Analyzer initialized")
-        logger.info(f"Using model: {self.model_name}")
+        logger.info("Using model: %s", self.model_name)
     
     def _setup_google_ai(self):
         """Setup Google Cloud AI authentication and model"""
@@ -57,128 +506,421 @@ class GoogleCloudLegalAnalyzer:
             )
         
         # Configure the API
+        genai = _get_genai()
         genai.configure(api_key=api_key)
         
         # Initialize the model
         try:
             self.model = genai.GenerativeModel(self.model_name)
+            self.fallback_model = genai.GenerativeModel(self.fallback_model_name)
+            self._warm_up_channel()
             logger.info("Google AI model initialized successfully")
         except Exception as e:
-            logger.error(f"Failed to initialize Google AI model: {e}")
+            logger.error("Failed to initialize Google AI model: %s", e)
             raise
     
-    def extract_text_from_file(self, file_path: str) -> str:
-        """Extract text from document based on file type"""
-        file_extension = Path(file_path).suffix.lower()
+    @staticmethod
+    def _warm_up_channel():
+        """Create the shared Gemini client now and start connecting its channel in the background.
+        
+        Both models use one gRPC channel, which multiplexes concurrent requests as HTTP/2
+        streams, so there is no connection pool to size. Left to the SDK, the client is created
+        lazily by the first requests (which can race to build separate channels), and the first
+        analysis pays the TLS handshake.
+        """
+        import grpc
+        from google.generativeai import client as genai_client
+        
+        channel = getattr(genai_client.get_default_generative_client().transport, 'grpc_channel', None)
+        if channel is not None:
+            # Not waited on: the connection completes while the app finishes starting
+            grpc.channel_ready_future(channel)
+    
+    def extract_text_from_file(self, file: BinaryIO, file_name: str, max_chars: Optional[int] = None) -> str:
+        """Extract text from a binary file object, choosing the format from the file name.
+        
+        When max_chars is given, PDF and TXT extraction stop reading once more than
+        that many characters are available (the result may still be longer).
+        """
+        file_extension = Path(file_name).suffix.lower()
         
         try:
+            # Always read from the start, wherever the stream was left
+            file.seek(0)
             if file_extension == '.pdf':
-                return self._extract_from_pdf(file_path)
+                return self._extract_from_pdf(file, max_chars)
             elif file_extension == '.docx':
-                return self._extract_from_docx(file_path)
+                return self._extract_from_docx(file)
             elif file_extension == '.txt':
-                return self._extract_from_txt(file_path)
+                return self._extract_from_txt(file, max_chars)
             else:
                 raise ValueError(f"Unsupported file format: {file_extension}. Please use PDF, DOCX, or TXT files.")
         except Exception as e:
-            logger.error(f"Error reading file {file_path}: {e}")
+            logger.error("Error reading file %s: %s", file_name, e)
             raise
     
-    def _extract_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file"""
-        text = ""
+    def _extract_from_pdf(self, file: BinaryIO, max_chars: Optional[int] = None) -> str:
+        """Extract text from PDF file, stopping once more than max_chars characters are available"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page_num, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += f"\n--- Page {page_num + 1} ---\n{page_text}\n"
-            return text.strip()
+            import pymupdf
+            
+            with pymupdf.open(stream=file.read(), filetype="pdf") as pdf_document:
+                page_texts = []
+                extracted_chars = 0
+                for page in pdf_document:
+                    page_text = page.get_text()
+                    page_texts.append(page_text)
+                    extracted_chars += len(page_text)
+                    if max_chars is not None and extracted_chars > max_chars:
+                        break
+            
+            parts = [
+                f"\n--- Page {page_num + 1} ---\n{page_text}\n"
+                for page_num, page_text in enumerate(page_texts)
+                if page_text
+            ]
+            return "".join(parts).strip()
         except Exception as e:
             raise Exception(f"Error reading PDF file: {e}")
     
-    def _extract_from_docx(self, file_path: str) -> str:
+    def _extract_from_docx(self, file: BinaryIO) -> str:
         """Extract text from DOCX file"""
         try:
-            doc = docx.Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    text += paragraph.text + "\n"
-            return text.strip()
+            import docx
+            
+            doc = docx.Document(file)
+            parts = [paragraph.text for paragraph in doc.paragraphs if paragraph.text.strip()]
+            return "\n".join(parts).strip()
         except Exception as e:
             raise Exception(f"Error reading DOCX file: {e}")
     
-    def _extract_from_txt(self, file_path: str) -> str:
-        """Extract text from TXT file"""
+    def _extract_from_txt(self, file: BinaryIO, max_chars: Optional[int] = None) -> str:
+        """Extract text from TXT file; bounded reads never load the whole file"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return file.read().strip()
+            # A UTF-8 character is at most 4 bytes, so this window holds over max_chars characters
+            data = file.read() if max_chars is None else file.read((max_chars + 1) * 4)
+            # A character split by the window is left pending rather than failing to decode
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            text = decoder.decode(data, final=max_chars is None or not file.read(1))
+            # Match text-mode universal newline handling
+            return text.replace('\r\n', '\n').replace('\r', '\n').strip()
         except Exception as e:
             raise Exception(f"Error reading TXT file: {e}")
     
-    def analyze_document(self, file_path: str) -> Dict[str, Any]:
+    def analyze_document(self, file: BinaryIO, file_name: str, file_key: Optional[str] = None) -> Dict[str, Any]:
         """Analyze a legal document using Google Cloud AI and return structured results"""
+        # Consume the streamed analysis: fields are parsed as Gemini generates them
+        # instead of buffering the whole response and parsing it afterwards
+        for event, payload in self.analyze_document_stream(file, file_name, file_key):
+            if event == "complete":
+                return payload
+        raise Exception("No response received from Google Cloud AI")
+    
+    def analyze_document_stream(self, file: BinaryIO, file_name: str,
+                                file_key: Optional[str] = None) -> Iterator[Tuple[str, Any]]:
+        """Analyze a legal document, yielding ("chunk", text) events as Gemini generates,
+        ("field", (name, value)) events as each top-level JSON field completes, and a
+        final ("complete", result) event with the structured analysis.
+        
+        ``file`` is a seekable binary file object and ``file_name`` selects its format;
+        ``file_key`` is the file's cache key when the caller has already hashed it.
+        """
         try:
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"File not found: {file_path}")
-            
-            logger.info(f"Analyzing document: {Path(file_path).name}")
-            
-            # Extract text from document
-            document_text = self.extract_text_from_file(file_path)
-            
-            if not document_text.strip():
-                raise ValueError("No text could be extracted from the document")
-            
-            # Detect document type first for logging
-            document_type = self._detect_document_type(document_text)
-            logger.info(f"Document type detected: {document_type}")
-            
-            # Truncate if too long (Gemini has token limits)
-            max_chars = 30000  # Conservative limit for Gemini
-            if len(document_text) > max_chars:
-                document_text = document_text[:max_chars] + "\n\n[Document truncated for analysis...]"
-                logger.info(f"Document truncated to {max_chars} characters")
-            
-            # Create analysis prompt based on document type
-            prompt = self._create_analysis_prompt(document_text)
-            
-            # Call Google Cloud AI
-            logger.info(f"Sending {document_type} document to Google Cloud AI for analysis...")
-            response = self.model.generate_content(prompt)
-            
-            if not response.text:
-                raise Exception("No response received from Google Cloud AI")
+            logger.info("Analyzing document: %s", file_name)
             
-            # Parse the response into structured data
-            analysis_result = self._parse_ai_response(response.text)
+            # Re-uploads of the same file are answered before any extraction
+            if file_key is None:
+                file_key = _file_cache_key(_stream_digest(file), file_name)
+            cached_result = self._get_cached_analysis(file_key)
+            if cached_result is not None:
+                yield "complete", cached_result
+                return
             
-            # Add metadata about the analysis
-            analysis_result["detectedDocumentType"] = document_type
-            analysis_result["analysisMetadata"] = {
-                "documentLength": len(document_text),
-                "processingTime": "completed",
-                "aiModel": self.model_name,
-                "analysisType": f"{document_type}_specific"
-            }
+            # Concurrent uploads of the same file share a single Gemini call
+            while True:
+                flight, is_leader = self._join_flight(file_key)
+                if is_leader:
+                    break
+                logger.info("Waiting for the identical analysis already in progress")
+                analysis_result = flight.result()
+                if analysis_result is not _FLIGHT_ABANDONED:
+                    yield "complete", analysis_result
+                    return
+                # The leading request went away; one of the waiting requests takes over
             
-            logger.info(f"{document_type.title()} document analysis completed successfully")
-            return analysis_result
+            try:
+                analysis_result = yield from self._run_analysis(file, file_name, file_key)
+            except Exception as e:
+                self._leave_flight(file_key)
+                flight.set_exception(e)
+                raise
+            except BaseException:
+                # An abandoned stream (client disconnect) did not fail the analysis, so
+                # waiting requests are handed the flight instead of an error
+                self._leave_flight(file_key)
+                flight.set_result(_FLIGHT_ABANDONED)
+                raise
+            self._leave_flight(file_key)
+            flight.set_result(analysis_result)
+            yield "complete", analysis_result
             
         except Exception as e:
-            logger.error(f"Error analyzing document: {e}")
+            logger.error("Error streaming document analysis: %s", e)
+            raise
+    
+    def _run_analysis(self, file: BinaryIO, file_name: str, file_key: str) -> Iterator[Tuple[str, Any]]:
+        """Extract and analyze a document missing from the file cache, yielding "chunk" and
+        "field" events and returning the analysis result"""
+        document_text = self._load_document_text(file, file_name, file_key)
+        
+        # The same text can arrive in a different file (another format, re-saved copy)
+        cache_key = self._analysis_cache_key(document_text)
+        cached_result = self._get_cached_analysis(cache_key)
+        if cached_result is not None:
+            self._cache_analysis(file_key, cached_result)
+            return cached_result
+        
+        document_text, document_type, prompt = self._prepare_analysis(document_text)
+        
+        # Stream from Google Cloud AI so the client sees output as soon as it is generated
+        logger.info("Streaming %s document analysis from Google Cloud AI...", document_type)
+        generation = self._generate_analysis(prompt, document_type)
+        
+        chunks = []
+        parsed_fields = {}
+        field_parser = _StreamingFieldParser()
+        while True:
+            try:
+                text = next(generation)
+            except StopIteration as done:
+                model_name = done.value
+                break
+            chunks.append(text)
+            yield "chunk", text
+            for field, value in field_parser.feed(text):
+                parsed_fields[field] = value
+                yield "field", (field, value)
+        
+        response_text = "".join(chunks)
+        if not response_text:
+            raise Exception("No response received from Google Cloud AI")
+        
+        # Clean JSON output is fully parsed already; anything else goes through the full parser
+        parsed_response = parsed_fields if field_parser.finish() and parsed_fields else None
+        analysis_result = self._finalize_analysis(
+            response_text, document_text, document_type, model_name, parsed_response
+        )
+        self._cache_analysis(cache_key, analysis_result)
+        self._cache_analysis(file_key, analysis_result)
+        return analysis_result
+    
+    def _join_flight(self, file_key: str) -> Tuple[Future, bool]:
+        """Return the in-progress analysis of a file, and whether the caller must run it"""
+        with self._inflight_lock:
+            flight = self._inflight.get(file_key)
+            if flight is not None:
+                return flight, False
+            flight = self._inflight[file_key] = Future()
+            return flight, True
+    
+    def _leave_flight(self, file_key: str):
+        """Stop sharing an analysis once it has finished (successful results are cached by then)"""
+        with self._inflight_lock:
+            self._inflight.pop(file_key, None)
+    
+    def analyze_documents(self, files: List[Tuple[BinaryIO, str]]) -> List[Dict[str, Any]]:
+        """Analyze several (file, file_name) documents concurrently.
+        
+        Returns one entry per file, in order, holding either the "analysis" or an "error".
+        """
+        # The pool is no wider than the Gemini slots so a batch never rejects its own documents
+        with ThreadPoolExecutor(max_workers=max(1, min(len(files), _BATCH_MAX_DOCUMENTS, self._gemini_concurrency)),
+                                thread_name_prefix="batch") as pool:
+            futures = [pool.submit(self.analyze_document, file, file_name) for file, file_name in files]
+        
+        results = []
+        for future in futures:
+            try:
+                results.append({"analysis": future.result()})
+            except Exception as e:
+                results.append({"error": f"Analysis failed: {str(e)}"})
+        return results
+    
+    def _load_document_text(self, file: BinaryIO, file_name: str, file_key: str) -> str:
+        """Extract the text of a document, failing if nothing could be extracted"""
+        # Re-uploads of the same file skip extraction entirely
+        document_text = self._text_cache.get(file_key)
+        if document_text is not None:
+            logger.info("Using cached document text")
+            return document_text
+        
+        # Extract text from document; pages past the analysis limit are never read
+        document_text = self.extract_text_from_file(file, file_name, max_chars=_MAX_ANALYSIS_CHARS)
+        
+        if not document_text.strip():
+            raise ValueError("No text could be extracted from the document")
+        
+        self._text_cache.put(file_key, document_text)
+        return document_text
+    
+    def _prepare_analysis(self, document_text: str) -> Tuple[str, str, str]:
+        """Detect the document type, truncate the text and build the analysis prompt"""
+        # Detect document type first for logging
+        document_type = self._detect_document_type(document_text[:_DETECTION_MAX_CHARS])
+        logger.info("Document type detected: %s", document_type)
+        
+        # Truncate if too long (Gemini has token limits)
+        if len(document_text) > _MAX_ANALYSIS_CHARS:
+            document_text = document_text[:_MAX_ANALYSIS_CHARS] + "\n\n[Document truncated for analysis...]"
+            logger.info("Document truncated to %d characters", _MAX_ANALYSIS_CHARS)
+        
+        # Create analysis prompt based on document type
+        prompt = self._create_analysis_prompt(document_text, document_type)
+        return document_text, document_type, prompt
+    
+    def _generate_analysis(self, prompt: str, document_type: str) -> Iterator[str]:
+        """Stream the analysis from Gemini in one of the bounded slots, yielding text chunks and
+        returning the model name.
+        
+        The Gemini stream is read on a pool thread and handed over through a queue, so the slot
+        is released when the RPC ends rather than when a slow client has read every chunk.
+        """
+        if not self._gemini_slots.acquire(timeout=_GEMINI_SLOT_WAIT_SECONDS):
+            raise AnalyzerBusyError("Too many analyses in progress, please retry shortly")
+        
+        output: queue.Queue = queue.Queue()
+        abandoned = threading.Event()
+        try:
+            self._gemini_executor.submit(
+                self._drain_generation, self._stream_from_gemini(prompt, document_type), output, abandoned
+            )
+        except BaseException:
+            self._gemini_slots.release()
             raise
+        
+        try:
+            while True:
+                kind, payload = output.get()
+                if kind == "chunk":
+                    yield payload
+                elif kind == "done":
+                    return payload
+                else:
+                    raise payload
+        finally:
+            # Lets the pool thread stop reading if the caller went away mid-stream
+            abandoned.set()
     
-    def _detect_document_type(self, document_text: str) -> str:
-        """Detect the type of legal document using Google Generative AI - Pure AI approach"""
+    def _drain_generation(self, generation: Iterator[str], output: queue.Queue, abandoned: threading.Event):
+        """Read a Gemini generation to the end on a pool thread, then release its slot"""
+        try:
+            while not abandoned.is_set():
+                try:
+                    output.put(("chunk", next(generation)))
+                except StopIteration as done:
+                    output.put(("done", done.value))
+                    return
+            generation.close()
+        except Exception as e:
+            output.put(("error", e))
+        finally:
+            self._gemini_slots.release()
+    
+    def _stream_from_gemini(self, prompt: str, document_type: str) -> Iterator[str]:
+        """Stream the analysis from Gemini, yielding text chunks and returning the model name.
+        
+        If the primary model times out before producing any output, the generation is retried
+        once on the fallback model; a timeout after output has been passed on is raised.
+        """
+        from google.api_core.exceptions import DeadlineExceeded
+        
+        generation_config = self._generation_configs.get(document_type, self._generation_configs["general"])
+        request_options = {"timeout": self.stream_timeout}
+        for model, model_name in ((self.model, self.model_name), (self.fallback_model, self.fallback_model_name)):
+            produced_output = False
+            try:
+                # The deadline can expire while iterating, not only on the call that opens the stream
+                response = model.generate_content(
+                    prompt, generation_config=generation_config, stream=True, request_options=request_options
+                )
+                for chunk in response:
+                    # .text raises on a chunk without parts, such as a final chunk that only
+                    # carries a SAFETY, MAX_TOKENS or OTHER finish reason
+                    if not (chunk.candidates and chunk.candidates[0].content.parts):
+                        continue
+                    if chunk.text:
+                        produced_output = True
+                        yield chunk.text
+                return model_name
+            except DeadlineExceeded:
+                if produced_output or model is self.fallback_model:
+                    raise
+                logger.warning(
+                    "%s timed out after %ss without output, retrying with %s",
+                    model_name, self.stream_timeout, self.fallback_model_name
+                )
+    
+    def _finalize_analysis(self, response_text: str, document_text: str, document_type: str, model_name: str,
+                           parsed_response: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Parse the AI response (unless already parsed incrementally) and attach analysis metadata"""
+        # Parse the response into structured data
+        if parsed_response is not None:
+            analysis_result = parsed_response
+        else:
+            analysis_result = self._parse_ai_response(response_text)
+        
+        # The response schema makes Gemini emit fields alphabetically, and the frontend renders
+        # sections in key order, so restore the template's field order (extra keys go last)
+        field_order = self._get_document_template(document_type)["fields"]
+        ordered_result = {field: analysis_result[field] for field in field_order if field in analysis_result}
+        ordered_result.update(analysis_result)
+        analysis_result = ordered_result
+        
+        # Add metadata about the analysis
+        analysis_result["detectedDocumentType"] = document_type
+        analysis_result["analysisMetadata"] = {
+            "documentLength": len(document_text),
+            "processingTime": "completed",
+            "aiModel": model_name,
+            "analysisType": f"{document_type}_specific"
+        }
+        
+        logger.info("%s document analysis completed successfully", document_type.title())
+        return analysis_result
+    
+    @staticmethod
+    def _analysis_cache_key(document_text: str) -> str:
+        """Cache key for an analysis: SHA-256 of the extracted document text"""
+        return hashlib.sha256(document_text.encode('utf-8')).hexdigest()
+    
+    def cached_analysis(self, file_key: str) -> Optional[Dict[str, Any]]:
+        """Return the analysis of a previously uploaded identical file, if still cached"""
+        return self._get_cached_analysis(file_key)
+    
+    def _get_cached_analysis(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return a previously computed analysis for an identical file or document text, if any"""
+        analysis_result = self._analysis_cache.get(cache_key)
+        if analysis_result is not None:
+            logger.info("Serving analysis from cache")
+        return analysis_result
+    
+    def _cache_analysis(self, cache_key: str, analysis_result: Dict[str, Any]):
+        """Store an analysis, evicting the least recently used entry when the cache is full"""
+        # Parse failures are not cached so a retry gets a fresh model response
+        if "error" not in analysis_result:
+            self._analysis_cache.put(cache_key, analysis_result)
+    
+    def _detect_document_type(self, head: str) -> str:
+        """Detect the type of legal document using Google Generative AI - Pure AI approach.
+        
+        head is the leading part of the document, already sized to _DETECTION_MAX_CHARS.
+        """
         try:
             # Create an enhanced prompt for accurate document type detection
-            detection_prompt = f"""You are a specialized legal document classifier. Analyze this legal document and determine its EXACT type.
-
-DOCUMENT TO CLASSIFY:
-{document_text[:4000]}
+            # Static instructions come first and the document last, so the prompt prefix is
+            # identical across requests (the configured 1.5 models do not cache prefixes, but
+            # models with implicit caching would reuse it)
+            detection_prompt = f"""You are a specialized legal document classifier. Analyze the legal document below and determine its EXACT type.
 
 Your task is to classify this document into ONE of these specific categories:
 
@@ -213,120 +955,46 @@ Your task is to classify this document into ONE of these specific categories:
 
 CRITICAL: Return ONLY the exact category name (one word), nothing else.
 
+DOCUMENT TO CLASSIFY:
+{head}
+
 Document Type:"""
 
             # Get AI classification
-            response = self.model.generate_content(detection_prompt)
+            response = self.model.generate_content(
+                detection_prompt,
+                generation_config=_DETECTION_GENERATION_CONFIG,
+                request_options={"timeout": self.request_timeout}
+            )
             detected_type = response.text.strip().lower()
             
             # Validate against our supported types
-            valid_types = [
-                "contract", "nda", "will", "lease", "employment", "partnership", 
-                "power_of_attorney", "license", "settlement", "corporate", 
-                "real_estate", "court_order", "judgment", "affidavit", "legal_notice", 
-                "insurance", "loan", "general"
-            ]
-            
-            if detected_type in valid_types:
-                logger.info(f"✅ AI successfully detected document type: {detected_type}")
+            if detected_type in _VALID_DOC_TYPES:
+                logger.info("✅ AI successfully detected document type: %s", detected_type)
                 return detected_type
             else:
-                logger.warning(f"⚠️ AI returned unrecognized type '{detected_type}', using 'general'")
+                logger.warning("⚠️ AI returned unrecognized type '%s', using 'general'", detected_type)
                 return "general"
                 
         except Exception as e:
-            logger.error(f"Critical error in AI document type detection: {e}")
+            logger.error("Critical error in AI document type detection: %s", e)
             logger.warning("AI detection failed - defaulting to 'general' document type")
             return "general"
     
     def _get_document_template(self, document_type: str) -> Dict[str, Any]:
         """Get analysis template based on document type - matching DOCUMENT_TYPES.md exactly"""
-        templates = {
-            "contract": {
-                "fields": ["documentType", "summary", "parties", "keyTerms", "obligations", "deliverables", "timeline", "paymentTerms", "terminationClauses", "penalties", "disputeResolution", "risks", "recommendations"],
-                "focus": "contractual obligations, performance requirements, and legal commitments"
-            },
-            "nda": {
-                "fields": ["documentType", "summary", "parties", "confidentialInfo", "restrictions", "duration", "exceptions", "returnRequirements", "penalties", "risks", "recommendations"],
-                "focus": "confidentiality obligations, information protection, and disclosure restrictions"
-            },
-            "will": {
-                "fields": ["documentType", "summary", "testator", "executor", "beneficiaries", "assets", "bequests", "guardianship", "conditions", "witnesses", "risks", "recommendations"],
-                "focus": "asset distribution, beneficiary rights, and estate planning"
-            },
-            "lease": {
-                "fields": ["documentType", "summary", "parties", "property", "rentAmount", "leaseTerm", "responsibilities", "restrictions", "renewalOptions", "terminationConditions", "securityDeposit", "risks", "recommendations"],
-                "focus": "rental obligations, property usage rights, and tenancy terms"
-            },
-            "employment": {
-                "fields": ["documentType", "summary", "parties", "position", "salary", "benefits", "duties", "workingConditions", "terminationConditions", "confidentiality", "nonCompete", "risks", "recommendations"],
-                "focus": "employment terms, job responsibilities, and worker rights"
-            },
-            "partnership": {
-                "fields": ["documentType", "summary", "partners", "businessPurpose", "capitalContributions", "profitSharing", "managementStructure", "decisionMaking", "dissolution", "liabilities", "risks", "recommendations"],
-                "focus": "business partnership terms, profit sharing, and management responsibilities"
-            },
-            "power_of_attorney": {
-                "fields": ["documentType", "summary", "principal", "agent", "powers", "limitations", "duration", "conditions", "revocation", "witnessRequirements", "risks", "recommendations"],
-                "focus": "delegated authority, agent powers, and principal protection"
-            },
-            "license": {
-                "fields": ["documentType", "summary", "parties", "licensedProperty", "scope", "restrictions", "royalties", "term", "terminationRights", "intellectualProperty", "risks", "recommendations"],
-                "focus": "usage rights, licensing terms, and intellectual property protection"
-            },
-            "settlement": {
-                "fields": ["documentType", "summary", "parties", "dispute", "settlementAmount", "paymentTerms", "releases", "conditions", "confidentiality", "enforcement", "risks", "recommendations"],
-                "focus": "dispute resolution, settlement terms, and legal releases"
-            },
-            "corporate": {
-                "fields": ["documentType", "summary", "entity", "directors", "shareholders", "governance", "voting", "meetings", "fiduciary", "compliance", "risks", "recommendations"],
-                "focus": "corporate governance, shareholder rights, and regulatory compliance"
-            },
-            "real_estate": {
-                "fields": ["documentType", "summary", "parties", "property", "purchasePrice", "financing", "contingencies", "inspections", "closing", "warranties", "risks", "recommendations"],
-                "focus": "property transfer, purchase terms, and real estate obligations"
-            },
-            "court_order": {
-                "fields": ["documentType", "summary", "court", "parties", "ruling", "requirements", "deadlines", "penalties", "compliance", "appealRights", "risks", "recommendations"],
-                "focus": "court mandates, compliance requirements, and legal obligations"
-            },
-            "judgment": {
-                "fields": ["documentType", "summary", "court", "parties", "caseNumber", "legalIssues", "facts", "legalPrinciples", "ratio", "ruling", "precedents", "implications", "recommendations"],
-                "focus": "judicial reasoning, legal precedents, and case implications"
-            },
-            "affidavit": {
-                "fields": ["documentType", "summary", "deponent", "purpose", "facts", "statements", "verification", "notarization", "jurisdiction", "consequences", "risks", "recommendations"],
-                "focus": "sworn statements, factual declarations, and legal attestations"
-            },
-            "legal_notice": {
-                "fields": ["documentType", "summary", "sender", "recipient", "issue", "demands", "deadlines", "consequences", "legalBasis", "nextSteps", "risks", "recommendations"],
-                "focus": "legal demands, compliance requirements, and potential consequences"
-            },
-            "insurance": {
-                "fields": ["documentType", "summary", "parties", "coverage", "premiums", "deductibles", "exclusions", "claims", "beneficiaries", "renewal", "risks", "recommendations"],
-                "focus": "insurance coverage, policy terms, and claim procedures"
-            },
-            "loan": {
-                "fields": ["documentType", "summary", "parties", "loanAmount", "interestRate", "repaymentTerms", "collateral", "defaults", "acceleration", "guarantees", "risks", "recommendations"],
-                "focus": "lending terms, repayment obligations, and default consequences"
-            },
-            "general": {
-                "fields": ["documentType", "summary", "keyPoints", "parties", "importantDates", "financialTerms", "obligations", "risks", "recommendations"],
-                "focus": "general legal provisions and key obligations"
-            }
-        }
-        
-        return templates.get(document_type, templates["general"])
+        return _TEMPLATES.get(document_type, _TEMPLATES["general"])
 
-    def _create_analysis_prompt(self, document_text: str) -> str:
+    def _create_analysis_prompt(self, document_text: str, document_type: str) -> str:
         """Create a detailed prompt for legal document analysis based on document type"""
-        
-        # First, detect document type
-        document_type = self._detect_document_type(document_text)
+        # The document is the only per-request part of the prompt, so this is a single concatenation
+        prefix = self._prompt_prefixes.get(document_type, self._prompt_prefixes["general"])
+        return prefix + document_text
+    
+    def _build_prompt_prefix(self, document_type: str) -> str:
+        """Build the static analysis prompt for a document type, which the document text follows"""
         template = self._get_document_template(document_type)
         
-        logger.info(f"Detected document type: {document_type}")
-        
         # Create dynamic JSON structure based on template with specific descriptions
         json_fields = {}
         for field in template["fields"]:
@@ -338,156 +1006,10 @@ Document Type:"""
                 json_fields[field] = [f"Detailed risk analysis with severity levels and mitigation strategies for {document_type}"]
             elif field == "recommendations":
                 json_fields[field] = [f"Actionable recommendations with step-by-step guidance for {document_type}"]
-        # Add document-specific field descriptions (matching DOCUMENT_TYPES.md exactly)
-        enhanced_descriptions = {
-            "contract": {
-                "keyTerms": "Most important contractual provisions",
-                "obligations": "What each party must do ",
-                "deliverables": "Specific items/services to be provided",
-                "timeline": "Important deadlines and milestones",
-                "paymentTerms": "Financial obligations and schedules",
-                "terminationClauses": "How the contract can end",
-                "penalties": "Consequences for breach",
-                "disputeResolution": "How conflicts are resolved"
-            },
-            "nda": {
-                "confidentialInfo": "What information is protected",
-                "restrictions": "Limitations on use and disclosure",
-                "duration": "How long confidentiality lasts",
-                "exceptions": "What information is not protected",
-                "returnRequirements": "What must be returned/destroyed",
-                "penalties": "Consequences for breach"
-            },
-            "will": {
-                "testator": "Person making the will ",
-                "executor": "Person managing the estate ",
-                "beneficiaries": "Who receives assets ",
-                "assets": "Property and belongings being distributed ",
-                "bequests": "Specific gifts and distributions ",
-                "guardianship": "Care arrangements for minors "
-            },
-            "lease": {
-                "property": "Description of leased premises",
-                "rentAmount": "Monthly/periodic payment",
-                "leaseTerm": "Duration of the lease",
-                "responsibilities": "Maintenance and care duties",
-                "securityDeposit": "Upfront payment requirements",
-                "renewalOptions": "Extension possibilities"
-            },
-            "employment": {
-                "position": "Job title and role",
-                "salary": "Compensation details",
-                "benefits": "Healthcare, vacation, etc.",
-                "duties": "Job responsibilities",
-                "workingConditions": "Hours, location, etc.",
-                "nonCompete": "Post-employment restrictions"
-            },
-            "partnership": {
-                "partners": "Business partners involved",
-                "businessPurpose": "What the partnership does",
-                "capitalContributions": "Money/assets each partner provides",
-                "profitSharing": "How profits are divided",
-                "managementStructure": "Who makes decisions",
-                "dissolution": "How partnership ends"
-            },
-            "power_of_attorney": {
-                "principal": "Person granting power",
-                "agent": "Person receiving power",
-                "powers": "What the agent can do",
-                "limitations": "Restrictions on authority",
-                "duration": "How long powers last",
-                "revocation": "How to cancel"
-            },
-            "license": {
-                "licensedProperty": "What's being licensed",
-                "scope": "Permitted uses",
-                "restrictions": "What's not allowed",
-                "royalties": "Payment terms",
-                "term": "License duration",
-                "intellectualProperty": "IP rights and protections"
-            },
-            "settlement": {
-                "dispute": "What conflict is being resolved",
-                "settlementAmount": "Payment details",
-                "paymentTerms": "When and how payment is made",
-                "releases": "What claims are being dropped",
-                "conditions": "Requirements for settlement",
-                "confidentiality": "Non-disclosure requirements"
-            },
-            "corporate": {
-                "entity": "Corporation details",
-                "directors": "Board members and roles",
-                "shareholders": "Ownership structure",
-                "governance": "How decisions are made",
-                "voting": "Shareholder voting rights",
-                "compliance": "Regulatory requirements"
-            },
-            "real_estate": {
-                "property": "Real estate being transferred",
-                "purchasePrice": "Sale amount",
-                "financing": "Loan and mortgage terms",
-                "contingencies": "Conditions for sale",
-                "inspections": "Property examination requirements",
-                "closing": "Transaction completion details"
-            },
-            "court_order": {
-                "court": "Issuing court information",
-                "ruling": "Court's decision",
-                "requirements": "What must be done",
-                "deadlines": "Time limits for compliance",
-                "penalties": "Consequences for non-compliance",
-                "appealRights": "Options for challenging"
-            },
-            "judgment": {
-                "court": "Court that delivered the judgment",
-                "caseNumber": "Official case reference",
-                "legalIssues": "Questions of law addressed",
-                "facts": "Key factual findings",
-                "legalPrinciples": "Legal doctrines applied",
-                "ratio": "The legal reasoning behind the decision (ratio decidendi)",
-                "ruling": "The final decision",
-                "precedents": "Previous cases cited",
-                "implications": "Impact on future cases"
-            },
-            "affidavit": {
-                "deponent": "Person making the sworn statement",
-                "purpose": "Reason for the affidavit",
-                "facts": "Factual statements being attested",
-                "statements": "Important declarations made",
-                "verification": "How the statement is verified",
-                "notarization": "Notary and witnessing details",
-                "jurisdiction": "Legal jurisdiction for the affidavit",
-                "consequences": "Implications of false statements"
-            },
-            "legal_notice": {
-                "sender": "Who is sending the notice",
-                "recipient": "Who must respond",
-                "issue": "Problem being addressed",
-                "demands": "What is required",
-                "deadlines": "Time limits for response",
-                "consequences": "What happens if ignored"
-            },
-            "insurance": {
-                "coverage": "What is protected",
-                "premiums": "Payment amounts",
-                "deductibles": "Out-of-pocket costs",
-                "exclusions": "What's not covered",
-                "claims": "How to file claims",
-                "beneficiaries": "Who receives payouts"
-            },
-            "loan": {
-                "loanAmount": "How much is borrowed",
-                "interestRate": "Cost of borrowing",
-                "repaymentTerms": "Payment schedule",
-                "collateral": "Security for the loan",
-                "defaults": "What happens if payments stop",
-                "guarantees": "Additional security"
-            }
-        }
-        
+
         # Apply enhanced descriptions based on document type
-        if document_type in enhanced_descriptions:
-            for field, enhanced_desc in enhanced_descriptions[document_type].items():
+        if document_type in _ENHANCED_DESCRIPTIONS:
+            for field, enhanced_desc in _ENHANCED_DESCRIPTIONS[document_type].items():
                 json_fields[field] = enhanced_desc
         
         # Ensure all template fields are included with proper descriptions
@@ -495,12 +1017,12 @@ Document Type:"""
             if field not in json_fields:
                 json_fields[field] = f"Relevant {field} information for this document type"
         
-        # Create the prompt with enhanced demystification instructions
+        # Create the prompt with enhanced demystification instructions.
+        # The document text is appended last so the instruction prefix is identical for every
+        # document of the same type: it is built once per type, and would be reusable by a
+        # model with implicit prefix caching (the configured 1.5 models have none).
         prompt = f"""You are an expert legal document analyzer and translator who specializes in DEMYSTIFYING complex legal language for both legal professionals and non-lawyers. Your mission is to make legal documents completely understandable while maintaining accuracy.
 
-DOCUMENT TO ANALYZE:
-{document_text}
-
 DOCUMENT TYPE DETECTED: {document_type.upper()}
 ANALYSIS FOCUS: {template['focus']}
 
@@ -529,22 +1051,10 @@ Please provide your analysis in the following JSON structure. Be thorough, accur
 {{"""
         
         # Add each field to the JSON structure with clear, simple format
-        for i, field in enumerate(template["fields"]):
-            if field in json_fields:
-                description = json_fields[field]
-            else:
-                description = f"Relevant {field} information for this document type"
-            
-            # Use simple string format for all fields to ensure proper parsing
-            if field in ["risks", "recommendations"]:
-                prompt += f'\n    "{field}": [\n        "First {field[:-1]} item with clear explanation",\n        "Second {field[:-1]} item with actionable details",\n        "Additional {field[:-1]} items as needed"\n    ]'
-            elif field in ["obligations", "keyTerms", "statements", "facts", "precedents", "legalPrinciples"]:
-                prompt += f'\n    "{field}": [\n        "First {field[:-1]} item with clear explanation",\n        "Second {field[:-1]} item with practical details",\n        "Additional {field[:-1]} items as needed"\n    ]'
-            else:
-                prompt += f'\n    "{field}": "Provide detailed information about {description}"'
-            
-            if i < len(template["fields"]) - 1:
-                prompt += ","
+        prompt += ",".join([
+            _render_field(field, json_fields.get(field, f"Relevant {field} information for this document type"))
+            for field in template["fields"]
+        ])
         
         prompt += """
 }
@@ -581,59 +1091,85 @@ DEMYSTIFICATION GOALS:
 - Transform legal complexity into practical understanding
 - Empower users with knowledge to make informed decisions
 
-FINAL VALIDATION: Ensure your analysis would help someone completely unfamiliar with legal terminology understand this document's full implications and make informed decisions."""
+FINAL VALIDATION: Ensure your analysis would help someone completely unfamiliar with legal terminology understand this document's full implications and make informed decisions.
 
+DOCUMENT TO ANALYZE:
+"""
         return prompt
     
     def _parse_ai_response(self, response_text: str) -> Dict[str, Any]:
         """Parse the AI response and return structured data"""
+        # Strict JSON output (the normal case, as JSON is requested) parses in a single step
         try:
-            # Try to find JSON in the response
+            return orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            pass
+        
+        try:
+            # Otherwise try to find JSON inside a markdown code block
             response_text = response_text.strip()
-            
-            # Remove any markdown code block markers
-            if response_text.startswith('```'):
-                lines = response_text.split('\n')
-                start_idx = 1  # Skip the opening ```
-                if lines[1].strip().lower() == 'json':
-                    start_idx = 2  # Skip ```json
-                end_idx = len(lines) - 1
-                for i in range(len(lines) - 1, -1, -1):
-                    if lines[i].strip() == '```':
-                        end_idx = i
-                        break
-                response_text = '\n'.join(lines[start_idx:end_idx])
+            fenced = _FENCE_RE.match(response_text)
+            if fenced:
+                response_text = fenced.group(1)
             
             # Parse JSON
-            parsed_response = json.loads(response_text)
+            parsed_response = orjson.loads(response_text)
             
             # Keep the response simple - no additional structuring
             # Just ensure it's valid JSON that matches our expected fields
             return parsed_response
             
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse AI response as JSON: {e}")
-            logger.error(f"Response text: {response_text[:500]}...")
+        except orjson.JSONDecodeError as e:
+            logger.error("Failed to parse AI response as JSON: %s", e)
+            logger.error("Response text: %s...", response_text[:500])
             
-            # Return a fallback response with enhanced error details
-            return {
-                "documentType": "Document Analysis",
-                "summary": "The document was analyzed but the response could not be parsed into structured format. The AI may have provided analysis in an unexpected format.",
-                "error": "JSON parsing failed",
-                "errorDetails": str(e),
-                "rawResponse": response_text[:1000] + "..." if len(response_text) > 1000 else response_text,
-                "recommendations": [{
-                    "item": "Manual review recommended",
-                    "severity": "HIGH", 
-                    "explanation": "The automated analysis encountered formatting issues. Please review the raw response above.",
-                    "action": "Contact support or retry the analysis"
-                }]
-            }
+            # Return a fallback response with enhanced error details and a bounded preview
+            raw_response = response_text[:_RAW_RESPONSE_PREVIEW_CHARS]
+            if len(response_text) > _RAW_RESPONSE_PREVIEW_CHARS:
+                raw_response += "..."
+            fallback_result = _PARSE_FAILURE_RESULT.copy()
+            fallback_result["errorDetails"] = str(e)
+            fallback_result["rawResponse"] = raw_response
+            return fallback_result
+
+# Largest request body accepted, in total across all files of a batch
+_MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+# Uploads up to this size stay in memory; larger ones spill to an anonymous temporary file.
+# Kept well below the upload limit so threads holding large uploads cannot pile up RAM.
+_UPLOAD_SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+# Directory for spilled uploads, resolved and created once (default: the system temp directory).
+# Point it at a tmpfs such as /dev/shm to keep even large uploads off disk.
+_UPLOAD_SPOOL_DIR = os.getenv('TEMP_UPLOAD_DIR') or None
+if _UPLOAD_SPOOL_DIR:
+    Path(_UPLOAD_SPOOL_DIR).mkdir(parents=True, exist_ok=True)
+
+class _SpooledUploadRequest(Request):
+    """Request that buffers uploaded files in memory, instead of Werkzeug's 500 KB spool limit"""
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.SpooledTemporaryFile(max_size=_UPLOAD_SPOOL_MAX_SIZE, mode='rb+', dir=_UPLOAD_SPOOL_DIR)
 
 # Flask API for integration with Node.js frontend
 app = Flask(__name__)
+app.request_class = _SpooledUploadRequest
+app.config['MAX_CONTENT_LENGTH'] = _MAX_UPLOAD_BYTES
 CORS(app)
 
+# Analyses are tens of KB of repetitive JSON; Brotli at level 4 costs about as much CPU as gzip
+# for a better ratio. Server-Sent Events (text/event-stream) are not a compressed mimetype,
+# so streamed analyses still reach the client frame by frame.
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_LEVEL'] = 4
+app.config['COMPRESS_BR_LEVEL'] = 4
+Compress(app)
+
+def _json_response(data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> Response:
+    """JSON response serialized with orjson (much faster than jsonify on large analyses)"""
+    return Response(orjson.dumps(data), status=status, headers=headers, mimetype='application/json')
+
 # Serve static files from frontend/public
 @app.route('/')
 def serve_index():
@@ -649,91 +1185,195 @@ def serve_static(filename):
         # If file not found, serve index.html for SPA behavior
         return send_from_directory('frontend/public', 'index.html')
 
+def _upload_cache_key(file) -> str:
+    """Cache key of an uploaded file, hashed straight from the upload stream"""
+    return _file_cache_key(_stream_digest(file.stream), file.filename)
+
+@app.errorhandler(RequestEntityTooLarge)
+def file_too_large(e):
+    """Reject uploads over the size limit with a JSON error like the other API failures"""
+    return _json_response({
+        "error": f"File too large: uploads are limited to {_MAX_UPLOAD_BYTES // (1024 * 1024)}MB"
+    }, 413)
+
 # Initialize the analyzer
 try:
     analyzer = GoogleCloudLegalAnalyzer()
     logger.info("Analyzer initialized successfully")
 except Exception as e:
-    logger.error(f"Failed to initialize Google Cloud Legal Analyzer: {e}")
+    logger.error("Failed to initialize Google Cloud Legal Analyzer: %s", e)
     analyzer = None
 
+# The analyzer is created once at import, so the health check body never changes
+_HEALTH_BYTES = orjson.dumps({
+    "status": "healthy" if analyzer else "error",
+    "service": "Google Cloud Legal Document Analyzer",
+    "google_ai_available": GOOGLE_AI_AVAILABLE,
+    "analyzer_initialized": analyzer is not None
+})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        "status": "healthy" if analyzer else "error",
-        "service": "Google Cloud Legal Document Analyzer",
-        "google_ai_available": GOOGLE_AI_AVAILABLE,
-        "analyzer_initialized": analyzer is not None
-    })
+    return Response(_HEALTH_BYTES, mimetype='application/json')
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_document():
     """Analyze a document file"""
     if not analyzer:
-        return jsonify({
+        return _json_response({
             "error": "Google Cloud AI analyzer not initialized. Check your API key and configuration."
-        }), 500
+        }, 500)
     
     try:
         # Check if file is in request
         if 'document' not in request.files:
-            return jsonify({"error": "No file provided"}), 400
+            return _json_response({"error": "No file provided"}, 400)
         
         file = request.files['document']
         if file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
-        
-        # Save uploaded file temporarily
-        temp_dir = Path("temp_uploads")
-        temp_dir.mkdir(exist_ok=True)
-        
-        file_path = temp_dir / file.filename
-        file.save(str(file_path))
+            return _json_response({"error": "No file selected"}, 400)
         
-        try:
-            # Analyze the document
-            analysis_result = analyzer.analyze_document(str(file_path))
-            
-            return jsonify({
+        # Duplicate uploads are answered without extracting the document again
+        file_key = _upload_cache_key(file)
+        cached_result = analyzer.cached_analysis(file_key)
+        if cached_result is not None:
+            return _json_response({
                 "message": "Analysis completed successfully",
                 "fileName": file.filename,
-                "analysis": analysis_result
+                "analysis": cached_result
             })
-            
-        finally:
-            # Clean up temporary file
-            if file_path.exists():
-                file_path.unlink()
         
+        # Analyze the upload in place: it is spooled in memory, so nothing is written to disk
+        analysis_result = analyzer.analyze_document(file.stream, file.filename, file_key)
+        
+        return _json_response({
+            "message": "Analysis completed successfully",
+            "fileName": file.filename,
+            "analysis": analysis_result
+        })
+        
+    except AnalyzerBusyError as e:
+        return _json_response({"error": str(e)}, 429, {"Retry-After": str(_GEMINI_BUSY_RETRY_AFTER_SECONDS)})
+    except RequestEntityTooLarge:
+        raise
     except Exception as e:
-        logger.error(f"Error in analyze_document: {e}")
-        return jsonify({
+        logger.error("Error in analyze_document: %s", e)
+        return _json_response({
             "error": f"Analysis failed: {str(e)}"
-        }), 500
+        }, 500)
+
+@app.route('/api/analyze/batch', methods=['POST'])
+def analyze_documents_batch():
+    """Analyze several uploaded document files concurrently"""
+    if not analyzer:
+        return _json_response({
+            "error": "Google Cloud AI analyzer not initialized. Check your API key and configuration."
+        }, 500)
+    
+    try:
+        files = [file for file in request.files.getlist('documents') if file.filename != '']
+        if not files:
+            return _json_response({"error": "No files provided"}, 400)
+        if len(files) > _BATCH_MAX_DOCUMENTS:
+            return _json_response({"error": f"Too many files: at most {_BATCH_MAX_DOCUMENTS} documents per batch"}, 400)
+        
+        results = analyzer.analyze_documents([(file.stream, file.filename) for file in files])
+        
+        return _json_response({
+            "message": "Batch analysis completed",
+            "results": [
+                {"fileName": file.filename, **result} for file, result in zip(files, results)
+            ]
+        })
+        
+    except RequestEntityTooLarge:
+        raise
+    except Exception as e:
+        logger.error("Error in analyze_documents_batch: %s", e)
+        return _json_response({
+            "error": f"Batch analysis failed: {str(e)}"
+        }, 500)
+
+def _sse_frame(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events frame"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {orjson.dumps(data).decode()}\n\n"
+
+@app.route('/api/analyze/stream', methods=['POST'])
+def analyze_document_stream():
+    """Analyze a document file, streaming the AI output as Server-Sent Events"""
+    if not analyzer:
+        return _json_response({
+            "error": "Google Cloud AI analyzer not initialized. Check your API key and configuration."
+        }, 500)
+
+    if 'document' not in request.files:
+        return _json_response({"error": "No file provided"}, 400)
+
+    file = request.files['document']
+    if file.filename == '':
+        return _json_response({"error": "No file selected"}, 400)
+
+    # Duplicate uploads are answered with a single complete event
+    file_key = _upload_cache_key(file)
+    cached_result = analyzer.cached_analysis(file_key)
+    if cached_result is not None:
+        frame = _sse_frame({
+            "message": "Analysis completed successfully",
+            "fileName": file.filename,
+            "analysis": cached_result
+        }, event="complete")
+        return Response(frame, mimetype='text/event-stream')
+
+    file_name = file.filename
+
+    def generate():
+        # stream_with_context keeps the request, and so the spooled upload, open until the stream ends
+        try:
+            for event, payload in analyzer.analyze_document_stream(file.stream, file_name, file_key):
+                if event == "chunk":
+                    yield _sse_frame({"text": payload})
+                elif event == "field":
+                    field, value = payload
+                    yield _sse_frame({"field": field, "value": value}, event="field")
+                else:
+                    yield _sse_frame({
+                        "message": "Analysis completed successfully",
+                        "fileName": file_name,
+                        "analysis": payload
+                    }, event="complete")
+        except AnalyzerBusyError as e:
+            # Headers are already sent, so the retry hint travels in the error event
+            yield _sse_frame({"error": str(e), "retryAfter": _GEMINI_BUSY_RETRY_AFTER_SECONDS}, event="error")
+        except Exception as e:
+            logger.error("Error in analyze_document_stream: %s", e)
+            yield _sse_frame({"error": f"Analysis failed: {str(e)}"}, event="error")
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
 
 @app.route('/api/test-ai', methods=['GET'])
 def test_ai():
     """Test Google Cloud AI connection"""
     if not analyzer:
-        return jsonify({
+        return _json_response({
             "status": "error",
             "message": "Analyzer not initialized"
-        }), 500
+        }, 500)
     
     try:
         # Test with a simple prompt
         test_response = analyzer.model.generate_content("Hello, please respond with 'AI connection successful'")
-        return jsonify({
+        return _json_response({
             "status": "success",
             "message": "Google Cloud AI connection successful",
             "test_response": test_response.text
         })
     except Exception as e:
-        return jsonify({
+        return _json_response({
             "status": "error", 
             "message": f"AI connection failed: {str(e)}"
-        }), 500
+        }, 500)
 
 if __name__ == '__main__':
     # Get port from environment variable (for production deployment) or default to 5001
@@ -742,9 +1382,9 @@ if __name__ == '__main__':
     
     if analyzer:
         logger.info("Starting Google Cloud Legal Document Analyzer API...")
-        logger.info(f"API will be available at: http://localhost:{port}")
-        logger.info(f"Health check: http://localhost:{port}/api/health")
-        logger.info(f"Test AI: http://localhost:{port}/api/test-ai")
+        logger.info("API will be available at: http://localhost:%s", port)
+        logger.info("Health check: http://localhost:%s/api/health", port)
+        logger.info("Test AI: http://localhost:%s/api/test-ai", port)
         app.run(host='0.0.0.0', port=port, debug=debug_mode)
     else:
         logger.error("Cannot start server - analyzer initialization failed")
@@ -0,0 +1,26 @@
+"""Gunicorn configuration for production deployments (loaded automatically by `gunicorn app:app`)"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5001')}"
+
+# Analyses spend most of their time waiting on Gemini, so threaded workers let
+# concurrent uploads overlap their AI round-trips instead of queueing
+worker_class = "gthread"
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+# Under gthread this is the worker heartbeat timeout: a worker is restarted only when it
+# stops responding to the master, it does not bound how long a single request runs
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+
+# Deploys let in-flight analyses finish: the worst case waits out the detection deadline,
+# then the streamed analysis deadline twice (primary, then fallback model)
+graceful_timeout = (
+    int(os.getenv('GEMINI_TIMEOUT_SECONDS', '60'))
+    + 2 * int(os.getenv('GEMINI_STREAM_TIMEOUT_SECONDS', '180'))
+    + 30  # text extraction and response delivery
+)
+
+# Each worker builds its own analyzer: gRPC channels and the analyzer's thread pool
+# do not survive fork, so the app must not be preloaded in the master
+preload_app = False